@@ -4,6 +4,7 @@ FPGA 项目生成器 —— 仅需一个 config.txt
 
 用法:
   python create_fpga_project.py config.txt
+  python create_fpga_project.py --sweep sweep.txt [-j N]   # 批量生成，sweep.txt 每行一个 config.txt
 
 config.txt 必须包含 [project]、[module] 和 [port] 段。
 
@@ -32,7 +33,38 @@ psum_out_2 : output : 32
 import os
 import sys
 import re
+import argparse
+import pathlib
+import string
 import textwrap
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 配置文件每行只做一次 match：空行/注释、[段名]、端口 name : dir : width、key = value
+_LINE_RE = re.compile(
+    r"\s*(?:"
+    r"(?:#.*)?"
+    r"|\[\s*(?P<section>.*?)\s*\]"
+    r"|(?P<port>[^\s:=]+)\s*:\s*(?P<dir>input|output|inout)\s*:\s*(?P<width>\d+)"
+    r"|(?P<key>[^=]*?)\s*=\s*(?P<val>.*?)"
+    r")\s*$"
+)
+
+
+def parse_port_line(line, line_num):
+    # 快速路径未匹配的端口行：逐项检查以给出具体的错误信息
+    parts = [p.strip() for p in line.strip().split(":", 2)]
+    if len(parts) != 3:
+        sys.exit(f"❌ 第 {line_num} 行端口格式错误: 应为 'name : dir : width'")
+    name, direction, width_str = parts
+    try:
+        width = int(width_str)
+    except ValueError:
+        sys.exit(f"❌ 第 {line_num} 行：宽度必须是整数")
+    if direction not in ("input", "output", "inout"):
+        sys.exit(f"❌ 第 {line_num} 行：方向必须是 input/output/inout")
+    return name, direction, width
 
 
 def parse_config(config_path):
@@ -42,41 +74,32 @@ def parse_config(config_path):
     content = {}
     current_section = None
 
-    with open(config_path, encoding="utf-8-sig") as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-
-            if line.startswith("[") and line.endswith("]"):
-                current_section = line[1:-1].strip()
+    lines = pathlib.Path(config_path).read_text(encoding="utf-8-sig").splitlines()
+    for line_num, line in enumerate(lines, 1):
+        m = _LINE_RE.match(line)
+        if m is not None:
+            if m["section"] is not None:
+                current_section = m["section"]
                 content[current_section] = {}
                 continue
+            if m["port"] is None and m["key"] is None:
+                continue
+
+        if current_section is None:
+            sys.exit(f"❌ 第 {line_num} 行：不在任何段中")
 
-            if current_section is None:
-                sys.exit(f"❌ 第 {line_num} 行：不在任何段中")
-
-            if current_section == "port":
-                parts = [p.strip() for p in re.split(r":", line, maxsplit=2)]
-                if len(parts) != 3:
-                    sys.exit(f"❌ 第 {line_num} 行端口格式错误: 应为 'name : dir : width'")
-                name, direction, width_str = parts
-                try:
-                    width = int(width_str)
-                except ValueError:
-                    sys.exit(f"❌ 第 {line_num} 行：宽度必须是整数")
-                if direction not in ("input", "output", "inout"):
-                    sys.exit(f"❌ 第 {line_num} 行：方向必须是 input/output/inout")
-                if "ports" not in content[current_section]:
-                    content[current_section]["ports"] = []
-                content[current_section]["ports"].append({
-                    "name": name, "direction": direction, "width": width
-                })
-            elif "=" in line:
-                key, val = [x.strip() for x in line.split("=", 1)]
-                content[current_section][key] = val
+        if current_section == "port":
+            if m is not None and m["port"] is not None:
+                name, direction, width = m["port"], m["dir"], int(m["width"])
             else:
-                sys.exit(f"❌ 第 {line_num} 行：无法解析")
+                name, direction, width = parse_port_line(line, line_num)
+            content[current_section].setdefault("ports", []).append({
+                "name": name, "direction": direction, "width": width
+            })
+        elif m is not None and m["key"] is not None:
+            content[current_section][m["key"]] = m["val"]
+        else:
+            sys.exit(f"❌ 第 {line_num} 行：无法解析")
 
     required_sections = ["project", "module", "port"]
     for sec in required_sections:
@@ -107,28 +130,33 @@ def parse_config(config_path):
     }
 
 
-def generate_rtl_top(module_name, ports):
-    input_ports = [p for p in ports if p["direction"] == "input"]
-    output_ports = [p for p in ports if p["direction"] == "output"]
-    inout_ports = [p for p in ports if p["direction"] == "inout"]
-
-    def port_decl(p):
-        vec = f"[{p['width']-1}:0]" if p["width"] > 1 else ""
-        direction = p["direction"]
-        spacing = " " * (6 - len(direction))
-        return f"  {direction}{spacing}{vec} {p['name']}"
-
-    all_decls = []
-    if input_ports:
-        all_decls.extend(port_decl(p) for p in input_ports)
-    if inout_ports:
-        all_decls.extend(port_decl(p) for p in inout_ports)
-    if output_ports:
-        all_decls.extend(port_decl(p) for p in output_ports)
-
-    port_list = ",\n".join(all_decls)
-
-    return textwrap.dedent(f"""\
+@functools.lru_cache(maxsize=None)
+def _split_tmpl(tmpl):
+    # 模板只解析一次：按占位符切成若干段字面量（{{ }} 已还原），
+    # 之后每次渲染只是拼接，不再重复扫描整段模板。
+    # 只支持 {name} 形式的占位符，格式说明与转换（如 {x:>4}、{x!r}）直接报错
+    literals, names, chunk = [], [], []
+    for literal, name, spec, conversion in string.Formatter().parse(tmpl):
+        chunk.append(literal)
+        if name is not None:
+            if spec or conversion or not name.isidentifier():
+                raise ValueError(f"模板占位符只支持 {{name}} 形式，不支持格式说明或转换: {name!r}")
+            literals.append("".join(chunk))
+            names.append(name)
+            chunk = []
+    literals.append("".join(chunk))
+    return tuple(literals), tuple(names)
+
+
+def _render(tmpl, **fields):
+    literals, names = _split_tmpl(tmpl)
+    out = [literals[0]]
+    for name, literal in zip(names, literals[1:]):
+        out += (fields[name], literal)
+    return "".join(out)
+
+
+_RTL_TOP_TMPL = textwrap.dedent("""\
 `default_nettype wire
 `timescale 1ns / 1ps
 
@@ -153,32 +181,28 @@ endmodule
 """)
 
 
-def generate_tb_top(module_name, ports):
-    has_clk = any(p["name"] == "clk" and p["direction"] == "input" for p in ports)
-    has_rst_n = any(p["name"] == "rst_n" and p["direction"] == "input" for p in ports)
-
-    decl_lines = []
-    for p in ports:
-        vec = f"[{p['width']-1}:0] " if p["width"] > 1 else ""
-        sig_type = "reg" if p["direction"] == "input" else "wire"
-        decl_lines.append(f"  {sig_type} {vec}{p['name']};")
+def generate_rtl_top(module_name, ports):
+    def port_decl(p):
+        vec = f"[{p['width']-1}:0]" if p["width"] > 1 else ""
+        direction = p["direction"]
+        spacing = " " * (6 - len(direction))
+        return f"  {direction}{spacing}{vec} {p['name']}"
 
-    clk_logic = "  initial begin clk = 0; forever #5 clk = ~clk; end\n" if has_clk else ""
-    rst_logic = "  initial begin rst_n = 0; #20 rst_n = 1; end\n" if has_rst_n else ""
+    # 按 input / inout / output 顺序排列端口
+    port_list = ",\n".join(
+        port_decl(p)
+        for direction in ("input", "inout", "output")
+        for p in ports if p["direction"] == direction
+    )
 
-    port_inst = ",\n".join(f"    .{p['name']}({p['name']})" for p in ports)
+    return _render(_RTL_TOP_TMPL, module_name=module_name, port_list=port_list)
 
-    inputs = [p for p in ports if p["direction"] == "input" and p["name"] not in ("clk", "rst_n")]
-    stimulus = ""
-    if inputs:
-        assigns = "\n".join(f"    {p['name']} = {p['width']}'d0;" for p in inputs)
-        stimulus = f"{assigns}\n    #100;"
 
-    return textwrap.dedent(f"""\
+_TB_TOP_TMPL = textwrap.dedent("""\
 `default_nettype wire
 `timescale 1ns / 1ps
 module tb_top;
-{chr(10).join(decl_lines)}
+{decl_lines}
 
 {clk_logic}
 {rst_logic}
@@ -195,69 +219,49 @@ endmodule
 """)
 
 
-def main():
-    if len(sys.argv) != 2:
-        print(__doc__.strip())
-        sys.exit(1)
-
-    config_file = sys.argv[1]
-    cfg = parse_config(config_file)
-
-    proj_name = cfg["project_name"]
-    board = cfg["board"]
-    top_module = cfg["top_module"]
-    ports = cfg["ports"]
-
-    # 创建项目目录
-    os.makedirs(proj_name, exist_ok=True)
-    os.chdir(proj_name)
-
-    # 创建标准目录结构（含 tb/sim）
-    os.makedirs("rtl", exist_ok=True)
-    os.makedirs("tb", exist_ok=True)
-    os.makedirs("tb/sim", exist_ok=True)
-    os.makedirs("constraints", exist_ok=True)
-    os.makedirs("scripts", exist_ok=True)
-
-    # 防止 tb/sim 中的仿真产物被提交
-    with open("tb/sim/.gitignore", "w", encoding="utf-8") as f:
-        f.write("*\n!.gitignore\n")
+def generate_tb_top(module_name, ports):
+    has_clk = any(p["name"] == "clk" and p["direction"] == "input" for p in ports)
+    has_rst_n = any(p["name"] == "rst_n" and p["direction"] == "input" for p in ports)
 
-    # 生成 RTL 顶层（仅当不存在时）
-    rtl_top_path = f"rtl/{top_module}.sv"
-    if not os.path.exists(rtl_top_path):
-        with open(rtl_top_path, "w", encoding="utf-8") as f:
-            f.write(generate_rtl_top(top_module, ports))
-    else:
-        print(f"⚠️  RTL 顶层模块已存在，跳过生成: {rtl_top_path}")
+    def sig_decl(p):
+        vec = f"[{p['width']-1}:0] " if p["width"] > 1 else ""
+        sig_type = "reg" if p["direction"] == "input" else "wire"
+        return f"  {sig_type} {vec}{p['name']};"
 
-    # 生成测试平台
-    with open("tb/tb_top.sv", "w", encoding="utf-8") as f:
-        f.write(generate_tb_top(top_module, ports))
+    decl_lines = "\n".join(sig_decl(p) for p in ports)
 
-    # 生成约束文件
-    with open(f"constraints/{board}.xdc", "w", encoding="utf-8") as f:
-        f.write(f"# {board.upper()} 引脚约束模板 - 请根据实际需求编辑\n")
+    clk_logic = "  initial begin clk = 0; forever #5 clk = ~clk; end\n" if has_clk else ""
+    rst_logic = "  initial begin rst_n = 0; #20 rst_n = 1; end\n" if has_rst_n else ""
 
-    # 生成根目录 .gitignore
-    with open(".gitignore", "w", encoding="utf-8") as f:
-        f.write(textwrap.dedent("""\
-/build/
-/tb/sim/
-.vscode/
-*.swp
-*~
-.vivado*
-*.log
-*.jou
-*.str
-xsim.dir/
-"""))
+    port_inst = ",\n".join(f"    .{p['name']}({p['name']})" for p in ports)
 
-    # 生成 CMakeLists.txt
-    cmake_template = """cmake_minimum_required(VERSION 3.20)
+    stimulus = "".join(
+        f"    {p['name']} = {p['width']}'d0;\n"
+        for p in ports
+        if p["direction"] == "input" and p["name"] not in ("clk", "rst_n")
+    )
+    if stimulus:
+        stimulus += "    #100;"
+
+    return _render(
+        _TB_TOP_TMPL,
+        module_name=module_name,
+        decl_lines=decl_lines,
+        clk_logic=clk_logic,
+        rst_logic=rst_logic,
+        port_inst=port_inst,
+        stimulus=stimulus,
+    )
+
+
+_CMAKE_TMPL = """cmake_minimum_required(VERSION 3.20)
 project({proj_name} LANGUAGES NONE)
 
+# Visual Studio/MSBuild 生成器每次构建都会重复检查、重跑 CMake，自定义目标很慢
+if(CMAKE_GENERATOR MATCHES "Visual Studio")
+  message(WARNING "建议使用 -G Ninja 生成构建文件，增量构建快得多")
+endif()
+
 # ========================
 # 用户输入参数
 # ========================
@@ -267,6 +271,33 @@ if(NOT VIVADO_PATH)
 endif()
 
 set(BOARD "{board}" CACHE STRING "开发板型号 (basys3 或 nexys_a7)")
+option(UVM_VERBOSE "配置时输出路径等调试信息" OFF)
+option(INCREMENTAL "启用 Vivado 增量编译（复用上次布线结果）" OFF)
+set(IP_CACHE_DIR "${{CMAKE_SOURCE_DIR}}/.ip_cache" CACHE PATH "Vivado IP 缓存目录（未改动的 IP 直接复用综合结果，留空则不缓存）")
+set(BIT_CACHE_DIR "${{CMAKE_SOURCE_DIR}}/.bit_cache" CACHE PATH "比特流缓存目录（输入未变时跳过 Vivado，留空则不缓存）")
+option(USE_OOC_SYNTHESIS "IP（rtl/ 下的 .xci 与 rtl/ip/）单独 OOC 综合，结果可经 IP 缓存复用" ON)
+set(SHELL_TOP "shell_top" CACHE STRING "静态 shell 顶层模块名（位于 rtl/shell/）")
+set(APP_CELL "u_app" CACHE STRING "shell 中用户应用的实例路径")
+
+include(ProcessorCount)
+ProcessorCount(NPROC)
+# 取不到核数时 NPROC 为 0，Vivado 脚本会改用 Windows 的 NUMBER_OF_PROCESSORS
+set(VIVADO_JOBS "${{NPROC}}" CACHE STRING "Vivado 并行任务数与线程数（默认为本机核数，0 表示由 Vivado 脚本决定）")
+# 以下取值都以 -name value 的形式拼进 cmd.exe 命令行，为空会让其后的参数整体错位
+if(NOT VIVADO_JOBS MATCHES "^[0-9]+$")
+  message(FATAL_ERROR "VIVADO_JOBS 必须是非负整数（0 表示由 Vivado 脚本决定），当前为 '${{VIVADO_JOBS}}'")
+endif()
+foreach(var SHELL_TOP APP_CELL)
+  if("${{${{var}}}}" STREQUAL "")
+    message(FATAL_ERROR "${{var}} 不能为空")
+  endif()
+endforeach()
+
+# xelab 默认 -mt auto（按 CPU 数并行编译）；只有显式指定时才传 -mt
+set(SIM_JOBS "" CACHE STRING "xelab 并行编译任务数（留空或 auto 为 xelab 自动选择，off 为关闭）")
+if(NOT SIM_JOBS MATCHES "^(|off|auto|[1-9][0-9]*)$")
+  message(FATAL_ERROR "SIM_JOBS 只能为空、off、auto 或正整数，当前为 '${{SIM_JOBS}}'")
+endif()
 
 # ========================
 # 工具路径（WSL 格式）
@@ -276,32 +307,73 @@ set(XSIM_DIR "${{VIVADO_PATH}}/bin")
 # ========================
 # WSL 到 Windows 路径转换函数
 # ========================
+# 项目所在盘的前缀只计算一次（/mnt/d/ → D:/）
+if(CMAKE_SOURCE_DIR MATCHES "^/mnt/([a-zA-Z])/")
+  string(TOUPPER "${{CMAKE_MATCH_1}}" WSL_DRIVE)
+  set(WSL_MNT_ROOT "/mnt/${{CMAKE_MATCH_1}}/")
+  set(WSL_WIN_ROOT "${{WSL_DRIVE}}:/")
+endif()
+
+# 单个路径（可位于任意盘，如 Vivado 安装目录）
 function(wsl_to_win_path LINUX_PATH WIN_PATH)
-  if(LINUX_PATH MATCHES "^/mnt/[a-zA-Z]/")
-    string(REGEX REPLACE "^/mnt/([a-zA-Z])/(.*)" "\\\\1:/\\\\2" WIN_TMP "${{LINUX_PATH}}")
-    string(TOUPPER "${{WIN_TMP}}" WIN_TMP)
-    set(${{WIN_PATH}} "${{WIN_TMP}}" PARENT_SCOPE)
+  if(LINUX_PATH MATCHES "^/mnt/([a-zA-Z])/")
+    string(TOUPPER "${{CMAKE_MATCH_1}}" DRIVE)
+    string(SUBSTRING "${{LINUX_PATH}}" 7 -1 REST)
+    set(${{WIN_PATH}} "${{DRIVE}}:/${{REST}}" PARENT_SCOPE)
   else()
     set(${{WIN_PATH}} "${{LINUX_PATH}}" PARENT_SCOPE)
   endif()
 endfunction()
 
+# 项目内的文件列表：一次 list(TRANSFORM) 替换盘符前缀，不再逐个文件做正则
+function(wsl_to_win_paths WIN_LIST)
+  set(PATHS ${{ARGN}})
+  if(WSL_MNT_ROOT)
+    list(TRANSFORM PATHS REPLACE "^${{WSL_MNT_ROOT}}" "${{WSL_WIN_ROOT}}")
+  endif()
+  set(${{WIN_LIST}} "${{PATHS}}" PARENT_SCOPE)
+endfunction()
+
 # ========================
 # 收集源文件（相对路径）
 # ========================
-file(GLOB_RECURSE SOURCES LIST_DIRECTORIES false RELATIVE "${{CMAKE_SOURCE_DIR}}" "${{CMAKE_SOURCE_DIR}}/rtl/*.sv" "${{CMAKE_SOURCE_DIR}}/rtl/*.v")
-file(GLOB_RECURSE TESTBENCH LIST_DIRECTORIES false RELATIVE "${{CMAKE_SOURCE_DIR}}" "${{CMAKE_SOURCE_DIR}}/tb/*.sv" "${{CMAKE_SOURCE_DIR}}/tb/*.v")
-
-# 转为绝对路径（Linux/WSL 格式）
-set(ABS_SOURCES "")
-foreach(f IN LISTS SOURCES)
-  list(APPEND ABS_SOURCES "${{CMAKE_SOURCE_DIR}}/${{f}}")
+# CONFIGURE_DEPENDS：构建时若发现新增或删除了文件，先自动重新配置，
+# 文件列表（sources.tcl、files.prj、比特流缓存清单）随之更新
+file(GLOB_RECURSE SOURCES LIST_DIRECTORIES false RELATIVE "${{CMAKE_SOURCE_DIR}}" CONFIGURE_DEPENDS "${{CMAKE_SOURCE_DIR}}/rtl/*.sv" "${{CMAKE_SOURCE_DIR}}/rtl/*.v")
+file(GLOB_RECURSE XCI_SOURCES LIST_DIRECTORIES false CONFIGURE_DEPENDS "${{CMAKE_SOURCE_DIR}}/rtl/*.xci")
+file(GLOB_RECURSE TESTBENCH LIST_DIRECTORIES false RELATIVE "${{CMAKE_SOURCE_DIR}}" CONFIGURE_DEPENDS "${{CMAKE_SOURCE_DIR}}/tb/*.sv" "${{CMAKE_SOURCE_DIR}}/tb/*.v")
+
+# 不单独编译、但会被 `include 或 $readmemh/$readmemb 读入的文件，改动后同样需要重跑
+set(AUX_PATTERNS *.vh *.svh *.mem *.hex *.dat)
+list(TRANSFORM AUX_PATTERNS PREPEND "${{CMAKE_SOURCE_DIR}}/rtl/" OUTPUT_VARIABLE RTL_AUX_GLOBS)
+file(GLOB_RECURSE RTL_AUX_FILES LIST_DIRECTORIES false CONFIGURE_DEPENDS ${{RTL_AUX_GLOBS}})
+
+# tb/sim/ 是仿真输出目录（xsim.dir 中同样会生成这类后缀的文件），不能参与递归 glob，
+# 否则每次仿真后都会触发重新配置：只取 tb/ 顶层，再递归其余子目录
+list(TRANSFORM AUX_PATTERNS PREPEND "${{CMAKE_SOURCE_DIR}}/tb/" OUTPUT_VARIABLE TB_AUX_GLOBS)
+file(GLOB TB_AUX_FILES LIST_DIRECTORIES false CONFIGURE_DEPENDS ${{TB_AUX_GLOBS}})
+file(GLOB TB_ENTRIES LIST_DIRECTORIES true CONFIGURE_DEPENDS "${{CMAKE_SOURCE_DIR}}/tb/*")
+foreach(d IN LISTS TB_ENTRIES)
+  if(IS_DIRECTORY "${{d}}" AND NOT d STREQUAL "${{CMAKE_SOURCE_DIR}}/tb/sim")
+    list(TRANSFORM AUX_PATTERNS PREPEND "${{d}}/" OUTPUT_VARIABLE SUB_GLOBS)
+    file(GLOB_RECURSE SUB_AUX_FILES LIST_DIRECTORIES false CONFIGURE_DEPENDS ${{SUB_GLOBS}})
+    list(APPEND TB_AUX_FILES ${{SUB_AUX_FILES}})
+  endif()
 endforeach()
 
-set(ABS_TESTBENCH "")
-foreach(f IN LISTS TESTBENCH)
-  list(APPEND ABS_TESTBENCH "${{CMAKE_SOURCE_DIR}}/${{f}}")
-endforeach()
+# rtl/ 只遍历这一次，再按子目录拆分（Vivado 脚本直接使用这里的结果）：
+#   rtl/shell/ 只用于分离编译，不参与仿真和完整流程；rtl/ip/ 单独 OOC 综合
+set(SHELL_SOURCES ${{SOURCES}})
+list(FILTER SHELL_SOURCES INCLUDE REGEX "^rtl/shell/")
+list(FILTER SOURCES EXCLUDE REGEX "^rtl/shell/")
+set(IP_SOURCES ${{SOURCES}})
+list(FILTER IP_SOURCES INCLUDE REGEX "^rtl/ip/")
+
+# 转为绝对路径（Linux/WSL 格式）
+list(TRANSFORM SOURCES PREPEND "${{CMAKE_SOURCE_DIR}}/" OUTPUT_VARIABLE ABS_SOURCES)
+list(TRANSFORM TESTBENCH PREPEND "${{CMAKE_SOURCE_DIR}}/" OUTPUT_VARIABLE ABS_TESTBENCH)
+list(TRANSFORM SHELL_SOURCES PREPEND "${{CMAKE_SOURCE_DIR}}/" OUTPUT_VARIABLE ABS_SHELL_SOURCES)
+list(TRANSFORM IP_SOURCES PREPEND "${{CMAKE_SOURCE_DIR}}/" OUTPUT_VARIABLE ABS_IP_SOURCES)
 
 # ========================
 # 板级配置
@@ -319,17 +391,11 @@ endif()
 # ========================
 # 转换为 Windows 路径（供 cmd.exe 使用）
 # ========================
-set(WINDOWS_SOURCES "")
-foreach(f IN LISTS ABS_SOURCES)
-  wsl_to_win_path("${{f}}" WIN_F)
-  list(APPEND WINDOWS_SOURCES "${{WIN_F}}")
-endforeach()
-
-set(WINDOWS_TESTBENCH "")
-foreach(f IN LISTS ABS_TESTBENCH)
-  wsl_to_win_path("${{f}}" WIN_F)
-  list(APPEND WINDOWS_TESTBENCH "${{WIN_F}}")
-endforeach()
+wsl_to_win_paths(WINDOWS_SOURCES ${{ABS_SOURCES}})
+wsl_to_win_paths(WINDOWS_TESTBENCH ${{ABS_TESTBENCH}})
+wsl_to_win_paths(WINDOWS_SHELL_SOURCES ${{ABS_SHELL_SOURCES}})
+wsl_to_win_paths(WINDOWS_IP_SOURCES ${{ABS_IP_SOURCES}})
+wsl_to_win_paths(WINDOWS_XCI_SOURCES ${{XCI_SOURCES}})
 
 wsl_to_win_path("${{CONSTRAINTS}}" WINDOWS_CONSTRAINTS)
 wsl_to_win_path("${{CMAKE_SOURCE_DIR}}" CMAKE_SOURCE_DIR_WIN)
@@ -344,66 +410,155 @@ set(SYNTH_DIR "${{CMAKE_BINARY_DIR}}/synth")
 file(MAKE_DIRECTORY ${{SYNTH_DIR}})
 wsl_to_win_path("${{SYNTH_DIR}}" SYNTH_DIR_WIN)
 
+# 供 Vivado 脚本 source 的文件列表（内容不变时不改写）
+function(tcl_list OUT_VAR)
+  set(ITEMS ${{ARGN}})
+  list(TRANSFORM ITEMS PREPEND "{{")
+  list(TRANSFORM ITEMS APPEND "}}")
+  string(JOIN " " JOINED ${{ITEMS}})
+  set(${{OUT_VAR}} "[list ${{JOINED}}]" PARENT_SCOPE)
+endfunction()
+tcl_list(RTL_LIST_TCL ${{WINDOWS_SOURCES}})
+tcl_list(SHELL_LIST_TCL ${{WINDOWS_SHELL_SOURCES}})
+tcl_list(IP_LIST_TCL ${{WINDOWS_IP_SOURCES}})
+tcl_list(XCI_LIST_TCL ${{WINDOWS_XCI_SOURCES}})
+set(SOURCES_TCL "${{SYNTH_DIR}}/sources.tcl")
+file(CONFIGURE OUTPUT "${{SOURCES_TCL}}" CONTENT "set rtl_list ${{RTL_LIST_TCL}}\\nset shell_list ${{SHELL_LIST_TCL}}\\nset ip_list ${{IP_LIST_TCL}}\\nset xci_list ${{XCI_LIST_TCL}}\\n" @ONLY)
+wsl_to_win_path("${{SOURCES_TCL}}" SOURCES_TCL_WIN)
+
+# IP 缓存目录（留空时以 none 占位，保持命令行上 -name value 成对）
+if(IP_CACHE_DIR)
+  file(MAKE_DIRECTORY "${{IP_CACHE_DIR}}")
+  wsl_to_win_path("${{IP_CACHE_DIR}}" IP_CACHE_DIR_WIN)
+else()
+  set(IP_CACHE_DIR_WIN none)
+endif()
+
 # Vivado 工具的 Windows 路径（关键！）
 wsl_to_win_path("${{VIVADO_PATH}}" VIVADO_PATH_WIN)
 wsl_to_win_path("${{XSIM_DIR}}" XSIM_DIR_WIN)
 
 # ========================
-# 将文件列表转为单个空格分隔字符串（关键！）
+# xvlog 项目文件（每行一个源文件，避开 cmd.exe 8191 字符的命令行上限）
 # ========================
-string(REPLACE ";" " " WINDOWS_SOURCES_STR "${{WINDOWS_SOURCES}}")
-string(REPLACE ";" " " WINDOWS_TESTBENCH_STR "${{WINDOWS_TESTBENCH}}")
-set(ALL_SV_FILES_STR "${{WINDOWS_SOURCES_STR}} ${{WINDOWS_TESTBENCH_STR}}")
+set(SIM_FILES ${{WINDOWS_SOURCES}} ${{WINDOWS_TESTBENCH}})
+list(TRANSFORM SIM_FILES PREPEND "sv work \\"")
+list(TRANSFORM SIM_FILES APPEND "\\"")
+# glbl.v 提供 Xilinx 原语仿真所需的全局复位/三态信号
+list(APPEND SIM_FILES "verilog work \\"${{VIVADO_PATH_WIN}}/data/verilog/src/glbl.v\\"")
+string(JOIN "\\n" SIM_PRJ_CONTENT ${{SIM_FILES}})
+# 内容不变时不改写，不会触发重新仿真
+file(CONFIGURE OUTPUT "${{SIM_WORK_DIR}}/files.prj" CONTENT "${{SIM_PRJ_CONTENT}}\\n" @ONLY)
 
 # ========================
 # 仿真目标
 # ========================
-add_custom_target(simulate
-  # 清理旧仿真数据
-  COMMAND ${{CMAKE_COMMAND}} -E remove_directory "${{SIM_WORK_DIR_WIN}}/xsim.dir"
-  COMMAND ${{CMAKE_COMMAND}} -E remove "${{SIM_WORK_DIR_WIN}}/sim1.wdb" "${{SIM_WORK_DIR_WIN}}/sim1.wcfg" "${{SIM_WORK_DIR_WIN}}/xsim.log"
+# XSim 自带预编译好的 Xilinx 仿真库，直接 -L 引用，无需 compile_simlib
+set(XSIM_LIBS "-L unisims_ver -L unimacro_ver -L secureip -L xpm")
 
-  # 编译 SystemVerilog 文件
-  COMMAND cmd.exe /c "cd /d ${{SIM_WORK_DIR_WIN}} && ${{XSIM_DIR_WIN}}/xvlog.bat --sv ${{ALL_SV_FILES_STR}}"
-  VERBATIM
+# 不能写成 if(SIM_JOBS)：off、0 在 CMake 中为假，会被当成“未指定”
+if(NOT SIM_JOBS STREQUAL "")
+  set(XELAB_MT "-mt ${{SIM_JOBS}}")
+endif()
 
-  # 生成仿真快照
-  COMMAND cmd.exe /c "cd /d ${{SIM_WORK_DIR_WIN}} && ${{XSIM_DIR_WIN}}/xelab.bat tb_top -snapshot sim1 -debug all"
+# 仿真结果 sim1.wdb 作为构建产物：源文件、头文件与存储器初始化文件都未改动时 simulate 直接跳过；
+# 保留 xsim.dir，配合 --incr 让 xvlog/xelab 只重新处理改动过的文件和设计单元
+set(SIM_WDB "${{SIM_WORK_DIR}}/sim1.wdb")
+add_custom_command(OUTPUT ${{SIM_WDB}}
+  # 编译 → 生成仿真快照 → 运行仿真，在同一个 cmd.exe 中完成，只付一次 WSL 互操作开销；
+  # .bat 只能经 cmd.exe 执行，工作目录由 WSL 互操作从 WORKING_DIRECTORY 转换过去，无需 cd /d
+  COMMAND cmd.exe /c "${{XSIM_DIR_WIN}}/xvlog.bat --incr -prj files.prj && ${{XSIM_DIR_WIN}}/xelab.bat --incr ${{XSIM_LIBS}} work.tb_top work.glbl -snapshot sim1 -debug all ${{XELAB_MT}} && ${{XSIM_DIR_WIN}}/xsim.bat sim1 -runall"
+  DEPENDS ${{ABS_SOURCES}} ${{ABS_TESTBENCH}} ${{RTL_AUX_FILES}} ${{TB_AUX_FILES}} "${{SIM_WORK_DIR}}/files.prj"
+  WORKING_DIRECTORY ${{SIM_WORK_DIR}}
   VERBATIM
+  COMMENT "▶️ 正在运行仿真..."
+)
+add_custom_target(simulate DEPENDS ${{SIM_WDB}})
+
+# 仿真产物（CMake 在 WSL 侧执行，使用 WSL 路径，一次删除）
+set(SIM_CLEAN_FILES "${{SIM_WORK_DIR}}/xsim.dir" "${{SIM_WDB}}" "${{SIM_WORK_DIR}}/sim1.wcfg" "${{SIM_WORK_DIR}}/xsim.log")
 
-  # 运行仿真
-  COMMAND cmd.exe /c "cd /d ${{SIM_WORK_DIR_WIN}} && ${{XSIM_DIR_WIN}}/xsim.bat sim1 -runall"
+# 只清空仿真数据，下次 simulate 完整重跑
+add_custom_target(simulate-clean
+  COMMAND ${{CMAKE_COMMAND}} -E rm -rf ${{SIM_CLEAN_FILES}}
   VERBATIM
+  COMMENT "🧹 正在清理仿真数据..."
+)
 
-  COMMENT "▶️ 正在运行仿真..."
+# 清空仿真数据后完整重跑
+add_custom_target(force_sim
+  COMMAND ${{CMAKE_COMMAND}} -E rm -rf ${{SIM_CLEAN_FILES}}
+  COMMAND ${{CMAKE_COMMAND}} --build "${{CMAKE_BINARY_DIR}}" --target simulate
+  VERBATIM
+  COMMENT "🧹 正在清理并重新运行仿真..."
 )
 
 # ========================
 # 比特流生成目标
 # ========================
+# Vivado 的临时文件、日志与 journal 都放进 SYNTH_DIR（Windows 侧原生 NTFS），
+# 每个流程各用一份日志，不再散落在构建目录根部
+set(VIVADO_BIN "${{VIVADO_PATH_WIN}}/bin/vivado.bat -mode batch -tempDir ${{SYNTH_DIR_WIN}}/tmp")
+set(VIVADO_SCRIPT "-source ${{CMAKE_SOURCE_DIR_WIN}}/scripts/build_bitstream.tcl -tclargs ${{PROJECT_NAME}} ${{PART}} ${{CMAKE_SOURCE_DIR_WIN}}/rtl ${{WINDOWS_CONSTRAINTS}} ${{SYNTH_DIR_WIN}} -sources ${{SOURCES_TCL_WIN}} -jobs ${{VIVADO_JOBS}}")
+
+# 比特流缓存的输入清单：第一行是影响结果的配置，其余为参与哈希的文件
+string(JOIN "\\n" BIT_INPUT_FILES ${{ABS_SOURCES}} ${{XCI_SOURCES}} ${{RTL_AUX_FILES}} "${{CONSTRAINTS}}" "${{CMAKE_SOURCE_DIR}}/scripts/build_bitstream.tcl")
+set(BIT_INPUTS "${{SYNTH_DIR}}/bit_inputs.txt")
+file(CONFIGURE OUTPUT "${{BIT_INPUTS}}" CONTENT "${{PART}} ${{VIVADO_PATH}} ${{INCREMENTAL}} ${{USE_OOC_SYNTHESIS}}\\n${{BIT_INPUT_FILES}}\\n" @ONLY)
+
 add_custom_target(bitstream
-  COMMAND cmd.exe /c "${{VIVADO_PATH_WIN}}/bin/vivado.bat -mode batch -source ${{CMAKE_SOURCE_DIR_WIN}}/scripts/build_bitstream.tcl -tclargs {proj_name} ${{PART}} ${{CMAKE_SOURCE_DIR_WIN}}/rtl ${{WINDOWS_CONSTRAINTS}} ${{SYNTH_DIR_WIN}}"
+  COMMAND ${{CMAKE_COMMAND}}
+    -DINPUTS=${{BIT_INPUTS}}
+    -DCACHE_DIR=${{BIT_CACHE_DIR}}
+    -DBIT=${{SYNTH_DIR}}/${{PROJECT_NAME}}.bit
+    "-DVIVADO_CMD=${{VIVADO_BIN}} -log ${{SYNTH_DIR_WIN}}/bitstream.log -journal ${{SYNTH_DIR_WIN}}/bitstream.jou ${{VIVADO_SCRIPT}} -incremental ${{INCREMENTAL}} -ip_cache ${{IP_CACHE_DIR_WIN}} -ooc ${{USE_OOC_SYNTHESIS}}"
+    -P ${{CMAKE_SOURCE_DIR}}/scripts/bit_cache.cmake
   WORKING_DIRECTORY ${{CMAKE_BINARY_DIR}}
   VERBATIM
   COMMENT "⚙️ 正在生成比特流..."
 )
 
 # ========================
-# 调试信息（可选）
+# 分离编译目标（静态 shell + 用户应用）
+# ========================
+# shell 只在 rtl/shell/、约束或构建脚本变化时重新布线
+set(ABSTRACT_SHELL "${{SYNTH_DIR}}/abstract_shell.dcp")
+add_custom_command(OUTPUT ${{ABSTRACT_SHELL}}
+  COMMAND cmd.exe /c "${{VIVADO_BIN}} -log ${{SYNTH_DIR_WIN}}/shell.log -journal ${{SYNTH_DIR_WIN}}/shell.jou ${{VIVADO_SCRIPT}} -flow shell -shell_top ${{SHELL_TOP}} -app_cell ${{APP_CELL}}"
+  DEPENDS ${{ABS_SHELL_SOURCES}} ${{CONSTRAINTS}} "${{CMAKE_SOURCE_DIR}}/scripts/build_bitstream.tcl"
+  WORKING_DIRECTORY ${{CMAKE_BINARY_DIR}}
+  VERBATIM
+  COMMENT "🧱 正在生成 abstract shell..."
+)
+add_custom_target(shell DEPENDS ${{ABSTRACT_SHELL}})
+
+# app_bitstream 只综合、布线用户应用
+add_custom_target(app_bitstream
+  COMMAND cmd.exe /c "${{VIVADO_BIN}} -log ${{SYNTH_DIR_WIN}}/app.log -journal ${{SYNTH_DIR_WIN}}/app.jou ${{VIVADO_SCRIPT}} -flow app -app_cell ${{APP_CELL}}"
+  WORKING_DIRECTORY ${{CMAKE_BINARY_DIR}}
+  VERBATIM
+  COMMENT "⚙️ 正在生成应用比特流..."
+)
+add_dependencies(app_bitstream shell)
+
+# ========================
+# 调试信息（-DUVM_VERBOSE=ON 时输出）
 # ========================
-message(STATUS "Vivado (WSL):     ${{VIVADO_PATH}}")
-message(STATUS "Vivado (Win):     ${{VIVADO_PATH_WIN}}")
-message(STATUS "XSIM_DIR (Win):   ${{XSIM_DIR_WIN}}")
-message(STATUS "Sim work dir:     ${{SIM_WORK_DIR_WIN}}")
+if(UVM_VERBOSE)
+  message(STATUS "Vivado (WSL):     ${{VIVADO_PATH}}")
+  message(STATUS "Vivado (Win):     ${{VIVADO_PATH_WIN}}")
+  message(STATUS "XSIM_DIR (Win):   ${{XSIM_DIR_WIN}}")
+  message(STATUS "Sim work dir:     ${{SIM_WORK_DIR_WIN}}")
+endif()
 """
 
-    cmake_content = cmake_template.format(proj_name=proj_name, board=board)
-    with open("CMakeLists.txt", "w", encoding="utf-8") as f:
-        f.write(cmake_content)
 
-    # 生成 Tcl 构建脚本
-    tcl_template = """if {{$argc < 5}} {{
-    error "用法: build_bitstream.tcl <proj_name> <part> <rtl_dir> <xdc_file> <proj_dir>"
+def generate_cmake(proj_name, board):
+    return _render(_CMAKE_TMPL, proj_name=proj_name, board=board)
+
+
+_TCL_TMPL = """if {{$argc < 5}} {{
+    error "用法: build_bitstream.tcl <proj_name> <part> <rtl_dir> <xdc_file> <proj_dir> ?-name value ...?"
 }}
 
 set proj_name [lindex $argv 0]
@@ -412,52 +567,493 @@ set rtl_dir [lindex $argv 2]
 set xdc_file [lindex $argv 3]
 set proj_dir [lindex $argv 4]
 
-create_project $proj_name $proj_dir -part $part
+# 可选参数（-name value 成对出现）
+#   -flow         project（完整工程流程）/ shell / app
+#   -jobs         launch_runs 并行任务数与线程数（缺省或为 0 时取 NUMBER_OF_PROCESSORS）
+#   -incremental  是否启用增量编译
+#   -ip_cache     IP 缓存目录（空或 none 表示不使用）
+#   -ooc          IP 是否单独 OOC 综合（关闭时随顶层一起综合）
+#   -shell_top    静态 shell 顶层模块（rtl/shell/）
+#   -app_cell     shell 中用户应用的实例路径
+#   -sources      CMake 生成的文件列表脚本（定义 rtl_list / shell_list / ip_list / xci_list）
+array set opts {{flow project jobs 0 incremental 0 ip_cache "" ooc 1 shell_top shell_top app_cell u_app sources ""}}
+foreach {{key val}} [lrange $argv 5 end] {{
+    set opts([string trimleft $key -]) $val
+}}
+if {{![string is integer -strict $opts(jobs)] || $opts(jobs) <= 0}} {{
+    set opts(jobs) [expr {{[info exists ::env(NUMBER_OF_PROCESSORS)] ? $::env(NUMBER_OF_PROCESSORS) : 8}}]
+}}
 
-proc add_rtl_files {{dir}} {{
-    foreach f [glob -nocomplain -directory $dir *] {{
-        if {{[file isdirectory $f]}} {{
-            add_rtl_files $f
-        }} elseif {{[string match -nocase "*.v" $f] || [string match -nocase "*.sv" $f]}} {{
-            add_files -norecurse $f
+# Vivado 进程内部（综合、布局布线）默认只用 2 个线程；
+# general.maxThreads 上限为 8，synth.maxThreads 上限为 4
+set max_threads [expr {{min($opts(jobs), 8)}}]
+set synth_threads [expr {{min($opts(jobs), 4)}}]
+set_param general.maxThreads $max_threads
+set_param synth.maxThreads $synth_threads
+
+# 逐层遍历：每层只做两次 glob（文件按后缀、子目录按类型过滤），不再逐项 stat
+proc rtl_files {{dir {{exclude ""}} {{patterns {{*.v *.sv}}}}}} {{
+    set files {{}}
+    set dirs [list $dir]
+    while {{[llength $dirs]}} {{
+        set dirs [lassign $dirs d]
+        lappend files {{*}}[glob -nocomplain -types f -directory $d {{*}}$patterns]
+        foreach sub [glob -nocomplain -types d -directory $d *] {{
+            if {{$sub ne $exclude}} {{
+                lappend dirs $sub
+            }}
         }}
     }}
+    return $files
+}}
+
+# 文件列表由 CMake 在配置阶段遍历一次后传入；单独运行本脚本时才自行遍历 rtl/
+# rtl/shell/ 只用于分离编译（其中的桩模块会与用户顶层重名）
+set shell_dir [file join $rtl_dir shell]
+if {{$opts(sources) ne ""}} {{
+    source $opts(sources)
+}} else {{
+    set rtl_list [rtl_files $rtl_dir $shell_dir]
+    set shell_list [rtl_files $shell_dir]
+    set ip_list [rtl_files [file join $rtl_dir ip]]
+    set xci_list [rtl_files $rtl_dir $shell_dir *.xci]
 }}
 
-add_rtl_files $rtl_dir
+# ========================
+# 分离编译（Abstract Shell）
+# ========================
+# shell：静态部分只在 rtl/shell/ 变化时综合、布线一次，
+#        用户应用以灰盒占位（rtl/shell/ 中需提供带 (* black_box *) 的桩模块，
+#        约束文件中需为该实例定义 pblock）
+# app：  只对用户 RTL 做 OOC 综合，并在 abstract shell 上布线
+set abstract_shell ${{proj_dir}}/abstract_shell.dcp
+
+if {{$opts(flow) eq "shell"}} {{
+    if {{![llength $shell_list]}} {{
+        error "rtl/shell/ 下没有源文件：请放入 shell 顶层 $opts(shell_top) 及用户应用的 (* black_box *) 桩模块，并在约束中为 $opts(app_cell) 定义 pblock"
+    }}
+    read_verilog -sv $shell_list
+    if {{$xdc_file != "" && [file exists $xdc_file]}} {{
+        read_xdc $xdc_file
+    }}
+    synth_design -top $opts(shell_top) -part $part
+
+    set_property HD.RECONFIGURABLE true [get_cells $opts(app_cell)]
+    update_design -cell $opts(app_cell) -buffer_ports
+    opt_design
+    place_design
+    route_design
+
+    write_checkpoint -force ${{proj_dir}}/shell_routed.dcp
+    write_abstract_shell -force -cell $opts(app_cell) $abstract_shell
+    puts "✅ Abstract shell 已生成: $abstract_shell"
+    return
+}}
+
+if {{$opts(flow) eq "app"}} {{
+    if {{![file exists $abstract_shell]}} {{
+        error "找不到 $abstract_shell，请先构建 shell 目标"
+    }}
+    read_verilog -sv $rtl_list
+    synth_design -mode out_of_context -top {top_module} -part $part
+    write_checkpoint -force ${{proj_dir}}/app_synth.dcp
+    close_design
+
+    open_checkpoint $abstract_shell
+    read_checkpoint -cell $opts(app_cell) ${{proj_dir}}/app_synth.dcp
+    opt_design
+    place_design
+    route_design
+
+    write_bitstream -force -cell $opts(app_cell) ${{proj_dir}}/${{proj_name}}_app.bit
+    puts "✅ 应用比特流已生成: ${{proj_dir}}/${{proj_name}}_app.bit"
+    return
+}}
+
+# ========================
+# 完整工程流程
+# ========================
+# 工程保留在 build/synth 中，再次构建时直接打开，
+# 由 Vivado 自己判断源文件是否改动、哪些 run 需要重跑。
+# 打开后下面的每项设置都按本次参数重新对齐（开启与关闭都要处理），
+# 否则改了 BOARD、INCREMENTAL 等选项后仍会沿用旧工程的设置
+set xpr ${{proj_dir}}/${{proj_name}}.xpr
+if {{[file exists $xpr]}} {{
+    open_project $xpr
+    if {{[get_property PART [current_project]] ne $part}} {{
+        # 器件变了，旧的综合/实现结果全部作废，直接重建
+        close_project
+        create_project -force $proj_name $proj_dir -part $part
+    }}
+}} else {{
+    create_project -force $proj_name $proj_dir -part $part
+}}
+
+# 只在取值变化时设置 run 属性，避免无谓地把 run 标记为过期
+proc set_run_property {{run prop value}} {{
+    set r [get_runs $run]
+    if {{[get_property $prop $r] ne $value}} {{
+        set_property -name $prop -value $value -objects $r
+    }}
+}}
 
-if {{$xdc_file != "" && [file exists $xdc_file]}} {{
+# IP 缓存：配置相同的 IP 直接从缓存取综合结果，不再重新综合
+if {{$opts(ip_cache) ni {{"" none}}}} {{
+    file mkdir $opts(ip_cache)
+    config_ip_cache -use_cache_location $opts(ip_cache)
+    set_property IP_CACHE_PERMISSIONS {{read write}} [current_project]
+}}
+# IP 内部常用的 XPM 库在工程级声明，不依赖 Vivado 扫描源码时再补
+set_property XPM_LIBRARIES {{XPM_CDC XPM_MEMORY}} [current_project]
+
+# launch_runs 的每个 run 都是独立的 Vivado 进程，不继承上面的 set_param，
+# 通过 TCL.PRE 钩子把线程数带进去。
+# 钩子脚本只在内容变化时改写：Vivado 会检查它的时间戳，无谓的改写会让 run 过期
+set threads_tcl ${{proj_dir}}/max_threads.tcl
+set threads_content "set_param general.maxThreads $max_threads\\nset_param synth.maxThreads $synth_threads\\n"
+set old_content ""
+if {{[file exists $threads_tcl]}} {{
+    set fh [open $threads_tcl r]
+    set old_content [read $fh]
+    close $fh
+}}
+if {{$old_content ne $threads_content}} {{
+    set fh [open $threads_tcl w]
+    puts -nonewline $fh $threads_content
+    close $fh
+}}
+set_run_property synth_1 STEPS.SYNTH_DESIGN.TCL.PRE $threads_tcl
+set_run_property impl_1 STEPS.INIT_DESIGN.TCL.PRE $threads_tcl
+
+# 增量编译：上次布线结果保存在项目目录之外，删除工程重建时也不会丢失
+set incr_dcp [file dirname $proj_dir]/incr/${{proj_name}}_routed.dcp
+if {{$opts(incremental)}} {{
+    set_run_property synth_1 {{STEPS.SYNTH_DESIGN.ARGS.MORE OPTIONS}} {{-incremental_mode default}}
+    set_run_property impl_1 INCREMENTAL_CHECKPOINT [expr {{[file exists $incr_dcp] ? $incr_dcp : ""}}]
+}} else {{
+    set_run_property synth_1 {{STEPS.SYNTH_DESIGN.ARGS.MORE OPTIONS}} ""
+    set_run_property impl_1 INCREMENTAL_CHECKPOINT ""
+}}
+
+# rtl/ip/ 的 OOC blockset：关闭 OOC 或对应文件已删除时先删掉，
+# 其中的文件随后由下面的同步重新加回 sources_1
+foreach fs [get_filesets -quiet -filter {{FILESET_TYPE == BlockSrcs && NAME =~ "*_ooc"}}] {{
+    set ip_module [string range $fs 0 end-4]
+    set keep 0
+    foreach f $ip_list {{
+        if {{[file rootname [file tail $f]] eq $ip_module}} {{
+            set keep $opts(ooc)
+        }}
+    }}
+    if {{!$keep}} {{
+        delete_fileset $fs
+    }}
+}}
+
+# 与 CMake 传入的文件列表同步：只添加新文件、移除已删除的文件，
+# 未改动的文件保留在工程中，不会让 run 过期
+set wanted [concat $rtl_list $xci_list]
+set stale {{}}
+foreach f [get_files -quiet -filter {{FILE_TYPE == Verilog || FILE_TYPE == SystemVerilog || FILE_TYPE == IP}}] {{
+    if {{[lsearch -exact $wanted $f] < 0}} {{
+        lappend stale $f
+    }}
+}}
+if {{[llength $stale]}} {{
+    remove_files $stale
+}}
+set added {{}}
+foreach f $wanted {{
+    if {{![llength [get_files -quiet $f]]}} {{
+        lappend added $f
+    }}
+}}
+if {{[llength $added]}} {{
+    add_files -norecurse $added
+}}
+
+# Vivado IP（.xci）：默认每个 IP 单独 OOC 综合，配置未变时直接命中 IP 缓存
+if {{[llength $xci_list]}} {{
+    set_property GENERATE_SYNTH_CHECKPOINT [expr {{$opts(ooc) ? 1 : 0}}] [get_files $xci_list]
+}}
+
+# 约束：只保留本次的 xdc（切换开发板后移除旧板的约束）
+set old_xdc {{}}
+foreach f [get_files -quiet -of_objects [get_filesets constrs_1]] {{
+    if {{$xdc_file eq "" || [file normalize $f] ne [file normalize $xdc_file]}} {{
+        lappend old_xdc $f
+    }}
+}}
+if {{[llength $old_xdc]}} {{
+    remove_files -fileset constrs_1 $old_xdc
+}}
+if {{$xdc_file != "" && [file exists $xdc_file] && ![llength [get_files -quiet -of_objects [get_filesets constrs_1] $xdc_file]]}} {{
     add_files -fileset constrs_1 -norecurse $xdc_file
 }}
 
 set_property top {top_module} [current_fileset]
 
-launch_runs synth_1 -jobs 4
-wait_on_run synth_1
-launch_runs impl_1 -jobs 4
-wait_on_run impl_1
+# rtl/ip/ 下每个文件（文件名即模块名）单独作为 OOC 综合 run，
+# launch_runs synth_1 时与顶层一起并行调度
+update_compile_order -fileset sources_1
+if {{$opts(ooc)}} {{
+    foreach f $ip_list {{
+        set ip_module [file rootname [file tail $f]]
+        if {{![llength [get_filesets -quiet ${{ip_module}}_ooc]]}} {{
+            create_fileset -blockset -define_from $ip_module ${{ip_module}}_ooc
+        }}
+    }}
+}}
 
+# 只有过期（源文件或设置改动）或未完成的 run 才重跑；返回本次是否真的运行过
+proc run_if_stale {{run jobs}} {{
+    set r [get_runs $run]
+    set ran 0
+    if {{[get_property NEEDS_REFRESH $r] || [get_property PROGRESS $r] ne "100%"}} {{
+        reset_run $r
+        launch_runs $r -jobs $jobs
+        wait_on_run $r
+        set ran 1
+    }}
+    if {{[get_property PROGRESS $r] ne "100%"}} {{
+        error "$run 运行失败，详见 [get_property DIRECTORY $r]"
+    }}
+    return $ran
+}}
+run_if_stale synth_1 $opts(jobs)
+set impl_ran [run_if_stale impl_1 $opts(jobs)]
+
+# 只有 impl_1 本次重新布线后才更新增量检查点：它是 impl_1 的 INCREMENTAL_CHECKPOINT，
+# 无谓的覆盖会改变时间戳，让 impl_1 下次被判为过期
+if {{$opts(incremental) && $impl_ran}} {{
+    file mkdir [file dirname $incr_dcp]
+    file copy -force [get_property DIRECTORY [get_runs impl_1]]/{top_module}_routed.dcp $incr_dcp
+}}
+
+open_run impl_1
 write_bitstream -force ${{proj_dir}}/${{proj_name}}.bit
 puts "✅ 比特流已生成: ${{proj_dir}}/${{proj_name}}.bit"
 """
 
-    tcl_content = tcl_template.format(top_module=top_module)
-    with open("scripts/build_bitstream.tcl", "w", encoding="utf-8") as f:
-        f.write(tcl_content)
+
+def generate_tcl(top_module):
+    return _render(_TCL_TMPL, top_module=top_module)
+
+
+_BIT_CACHE_CMAKE = """\
+# 比特流缓存：输入（源文件、头文件与存储器初始化文件、约束、构建脚本、器件、Vivado 版本与选项）的哈希
+# 与某次构建相同时，直接取回当时的比特流，跳过综合与实现
+#
+# 用法: cmake -DINPUTS=<清单> -DCACHE_DIR=<缓存目录> -DBIT=<比特流> -DVIVADO_CMD=<命令> -P bit_cache.cmake
+#   清单第一行为附加的键，其余每行一个输入文件；CACHE_DIR 为空时不使用缓存
+
+if(CACHE_DIR)
+  file(STRINGS "${INPUTS}" LINES)
+  list(POP_FRONT LINES KEY)
+  foreach(f IN LISTS LINES)
+    # 缺失的文件（如尚未创建的约束）也计入键，之后补上时不会命中旧结果
+    if(EXISTS "${f}")
+      file(SHA256 "${f}" HASH)
+    else()
+      set(HASH "missing")
+    endif()
+    string(APPEND KEY " ${f}=${HASH}")
+  endforeach()
+  string(SHA256 KEY "${KEY}")
+  set(CACHED "${CACHE_DIR}/${KEY}.bit")
+
+  if(EXISTS "${CACHED}")
+    execute_process(COMMAND "${CMAKE_COMMAND}" -E copy "${CACHED}" "${BIT}" RESULT_VARIABLE RC)
+    if(NOT RC EQUAL 0)
+      message(FATAL_ERROR "无法从缓存取回比特流: ${CACHED} → ${BIT}")
+    endif()
+    message(STATUS "♻️ 输入未变，使用缓存的比特流: ${CACHED}")
+    return()
+  endif()
+endif()
+
+execute_process(COMMAND cmd.exe /c "${VIVADO_CMD}" RESULT_VARIABLE RC)
+if(NOT RC EQUAL 0)
+  message(FATAL_ERROR "Vivado 运行失败（返回值 ${RC}）")
+endif()
+if(NOT EXISTS "${BIT}")
+  message(FATAL_ERROR "Vivado 运行结束，但未生成比特流: ${BIT}")
+endif()
+
+if(CACHE_DIR)
+  # 比特流已生成，存入缓存失败只影响下次复用，不让构建失败
+  file(MAKE_DIRECTORY "${CACHE_DIR}")
+  execute_process(COMMAND "${CMAKE_COMMAND}" -E copy "${BIT}" "${CACHED}" RESULT_VARIABLE RC)
+  if(NOT RC EQUAL 0)
+    message(WARNING "比特流未能存入缓存: ${CACHED}")
+  endif()
+endif()
+"""
+
+
+_XDC_TMPL = "# {board} 引脚约束模板 - 请根据实际需求编辑\n"
+
+_SIM_GITIGNORE = "*\n!.gitignore\n"
+
+_GITIGNORE = """\
+/build/
+/tb/sim/
+/.ip_cache/
+/.bit_cache/
+.vscode/
+*.swp
+*~
+.vivado*
+*.log
+*.jou
+*.str
+xsim.dir/
+"""
+
+
+def write_files(root, files):
+    # 内容已全部生成好，这里并发落盘；每个文件只做一次 write(2)，
+    # 在 WSL 的 /mnt/* 上可以把多次 9P 往返重叠起来。
+    # 内容未变的文件不改写（mtime 不变，CMake 不会因此重新配置），
+    # 有变化时先写临时文件再 os.replace，避免留下写了一半的文件
+    def write_one(item):
+        path, content = item
+        target = pathlib.Path(root, path)
+        data = content.encode("utf-8")
+        try:
+            if target.read_bytes() == data:
+                return
+        except FileNotFoundError:
+            pass
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write_one, files))
+
+
+def build_one(cfg):
+    # 所有路径都以项目目录为根拼接，不 chdir，便于在进程池中并行生成多个项目
+    proj_name = cfg["project_name"]
+    board = cfg["board"]
+    top_module = cfg["top_module"]
+    ports = cfg["ports"]
+
+    # 创建标准目录结构（含 tb/sim）：只建叶子目录，父目录由 makedirs 一并带出
+    for d in ("rtl/core", "rtl/ip", "rtl/shell", "tb/sim", "constraints", "scripts"):
+        os.makedirs(os.path.join(proj_name, d), exist_ok=True)
+
+    files = [
+        # 防止 tb/sim 中的仿真产物被提交
+        ("tb/sim/.gitignore", _SIM_GITIGNORE),
+        # 测试平台
+        ("tb/tb_top.sv", generate_tb_top(top_module, ports)),
+        # 约束文件
+        (f"constraints/{board}.xdc", _render(_XDC_TMPL, board=board.upper())),
+        # 根目录 .gitignore
+        (".gitignore", _GITIGNORE),
+        # CMakeLists.txt
+        ("CMakeLists.txt", generate_cmake(proj_name, board)),
+        # Tcl 构建脚本
+        ("scripts/build_bitstream.tcl", generate_tcl(top_module)),
+        # 比特流缓存脚本
+        ("scripts/bit_cache.cmake", _BIT_CACHE_CMAKE),
+    ]
+
+    # RTL 顶层（仅当不存在时）
+    rtl_top_path = f"rtl/{top_module}.sv"
+    if not os.path.exists(os.path.join(proj_name, rtl_top_path)):
+        files.append((rtl_top_path, generate_rtl_top(top_module, ports)))
+    else:
+        print(f"⚠️  RTL 顶层模块已存在，跳过生成: {proj_name}/{rtl_top_path}")
+
+    write_files(proj_name, files)
+    return proj_name
+
+
+def read_sweep(sweep_path):
+    # 每行一个 config.txt 路径，相对路径以 sweep 文件所在目录为准；# 开头为注释
+    if not os.path.isfile(sweep_path):
+        sys.exit(f"❌ 错误: sweep 文件 '{sweep_path}' 不存在")
+
+    base_dir = os.path.dirname(os.path.abspath(sweep_path))
+    config_paths = []
+    for line in pathlib.Path(sweep_path).read_text(encoding="utf-8-sig").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            config_paths.append(os.path.join(base_dir, line))
+
+    if not config_paths:
+        sys.exit(f"❌ sweep 文件 '{sweep_path}' 中没有任何配置")
+    return config_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("config", nargs="?", help="项目配置文件 config.txt")
+    parser.add_argument("--sweep", metavar="SWEEP_TXT", help="批量生成：每行一个 config.txt 路径")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="--sweep 时的并行进程数（默认为 CPU 核数）")
+    args = parser.parse_args()
+
+    if not args.config and not args.sweep:
+        print(__doc__.strip())
+        sys.exit(1)
+    if args.config and args.sweep:
+        parser.error("config 与 --sweep 只能二选一")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("-j/--jobs 必须为正整数")
+
+    # Vivado/XSim 是 Windows 程序：项目放在 /mnt/<盘符>/ 下时它们直接读写 NTFS；
+    # 放在 WSL 原生文件系统中则要经 \\wsl$ 走 9P（慢 6~8 倍），且生成的 CMake 无法转换此类路径
+    cwd = os.getcwd()
+    if os.environ.get("WSL_DISTRO_NAME") and not re.match(r"/mnt/[a-zA-Z](/|$)", cwd):
+        print(f"⚠️  当前目录 {cwd} 不在 /mnt/<盘符>/ 下，Windows 侧的 Vivado/XSim 将经 \\\\wsl$ 访问项目，")
+        print("    编译会明显变慢，且生成的 CMake 无法转换此路径；建议在 /mnt/c、/mnt/d 等目录下创建项目")
+
+    if args.sweep:
+        # 先在主进程中解析并校验全部配置，任何一个出错都不会生成半批项目
+        cfgs = [parse_config(path) for path in read_sweep(args.sweep)]
+        names = [cfg["project_name"] for cfg in cfgs]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            sys.exit(f"❌ sweep 中项目名重复: {', '.join(duplicates)}")
+
+        # 进程池会拉起 multiprocessing/socket 等一串模块（冷启动约 20 ms），只在 --sweep 时导入
+        from concurrent.futures import ProcessPoolExecutor
+
+        # 各变体写入互不相同的项目目录，没有共享状态，可直接并行
+        with ProcessPoolExecutor(max_workers=args.jobs or os.cpu_count()) as pool:
+            for proj_name in pool.map(build_one, cfgs):
+                print(f"✅ {proj_name}")
+        print(f"\n🎉 共创建 {len(cfgs)} 个项目")
+        return
+
+    cfg = parse_config(args.config)
+    build_one(cfg)
+
+    proj_name = cfg["project_name"]
+    board = cfg["board"]
+    top_module = cfg["top_module"]
 
     # 输出成功信息
     print(f"\n🎉 项目 '{proj_name}' 创建成功！")
     print(f"   • 顶层模块: {top_module}")
     print(f"   • 开发板:   {board}")
     print(f"\n📁 RTL 顶层: ./rtl/{top_module}.sv （可编辑）")
+    print(f"📁 子模块:   ./rtl/core/ （随顶层综合）、./rtl/ip/ （每个文件单独 OOC 并行综合）")
+    print(f"🧱 分离编译: ./rtl/shell/ 放入 shell 顶层 shell_top（用户应用例化为 u_app）与应用的 (* black_box *) 桩模块，")
+    print(f"            并在约束中为 u_app 定义 pblock，之后可用 shell / app_bitstream 目标")
     print(f"🧪 测试平台: ./tb/tb_top.sv")
     print(f"📂 仿真输出: ./tb/sim/ （已预创建）")
     print(f"🔧 约束模板: ./constraints/{board}.xdc")
     print(f"\n🚀 快速开始仿真:")
     print(f"   cd {proj_name}")
     print(f"   mkdir build && cd build")
-    print(f"   cmake .. -DVIVADO_PATH=/your/vivado/path -DBOARD={board}")
-    print(f"   cmake --build . --target simulate")
+    print(f"   cmake .. -G Ninja -DVIVADO_PATH=/your/vivado/path -DBOARD={board}    # 需要 ninja-build")
+    print(f"   cmake --build . --target simulate    # 源文件未改动时跳过；强制重跑用 force_sim，只清理用 simulate-clean")
     print(f"\n💡 提示: 实现你的设计后，可运行 'cmake --build . --target bitstream'")
 
 
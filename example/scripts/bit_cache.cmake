@@ -0,0 +1,47 @@
+# 比特流缓存：输入（源文件、头文件与存储器初始化文件、约束、构建脚本、器件、Vivado 版本与选项）的哈希
+# 与某次构建相同时，直接取回当时的比特流，跳过综合与实现
+#
+# 用法: cmake -DINPUTS=<清单> -DCACHE_DIR=<缓存目录> -DBIT=<比特流> -DVIVADO_CMD=<命令> -P bit_cache.cmake
+#   清单第一行为附加的键，其余每行一个输入文件；CACHE_DIR 为空时不使用缓存
+
+if(CACHE_DIR)
+  file(STRINGS "${INPUTS}" LINES)
+  list(POP_FRONT LINES KEY)
+  foreach(f IN LISTS LINES)
+    # 缺失的文件（如尚未创建的约束）也计入键，之后补上时不会命中旧结果
+    if(EXISTS "${f}")
+      file(SHA256 "${f}" HASH)
+    else()
+      set(HASH "missing")
+    endif()
+    string(APPEND KEY " ${f}=${HASH}")
+  endforeach()
+  string(SHA256 KEY "${KEY}")
+  set(CACHED "${CACHE_DIR}/${KEY}.bit")
+
+  if(EXISTS "${CACHED}")
+    execute_process(COMMAND "${CMAKE_COMMAND}" -E copy "${CACHED}" "${BIT}" RESULT_VARIABLE RC)
+    if(NOT RC EQUAL 0)
+      message(FATAL_ERROR "无法从缓存取回比特流: ${CACHED} → ${BIT}")
+    endif()
+    message(STATUS "♻️ 输入未变，使用缓存的比特流: ${CACHED}")
+    return()
+  endif()
+endif()
+
+execute_process(COMMAND cmd.exe /c "${VIVADO_CMD}" RESULT_VARIABLE RC)
+if(NOT RC EQUAL 0)
+  message(FATAL_ERROR "Vivado 运行失败（返回值 ${RC}）")
+endif()
+if(NOT EXISTS "${BIT}")
+  message(FATAL_ERROR "Vivado 运行结束，但未生成比特流: ${BIT}")
+endif()
+
+if(CACHE_DIR)
+  # 比特流已生成，存入缓存失败只影响下次复用，不让构建失败
+  file(MAKE_DIRECTORY "${CACHE_DIR}")
+  execute_process(COMMAND "${CMAKE_COMMAND}" -E copy "${BIT}" "${CACHED}" RESULT_VARIABLE RC)
+  if(NOT RC EQUAL 0)
+    message(WARNING "比特流未能存入缓存: ${CACHED}")
+  endif()
+endif()
@@ -1,5 +1,5 @@
 if {$argc < 5} {
-    error "用法: build_bitstream.tcl <proj_name> <part> <rtl_dir> <xdc_file> <proj_dir>"
+    error "用法: build_bitstream.tcl <proj_name> <part> <rtl_dir> <xdc_file> <proj_dir> ?-name value ...?"
 }
 
 set proj_name [lindex $argv 0]
@@ -8,30 +8,269 @@ set rtl_dir [lindex $argv 2]
 set xdc_file [lindex $argv 3]
 set proj_dir [lindex $argv 4]
 
-create_project $proj_name $proj_dir -part $part
+# 可选参数（-name value 成对出现）
+#   -flow         project（完整工程流程）/ shell / app
+#   -jobs         launch_runs 并行任务数与线程数（缺省或为 0 时取 NUMBER_OF_PROCESSORS）
+#   -incremental  是否启用增量编译
+#   -ip_cache     IP 缓存目录（空或 none 表示不使用）
+#   -ooc          IP 是否单独 OOC 综合（关闭时随顶层一起综合）
+#   -shell_top    静态 shell 顶层模块（rtl/shell/）
+#   -app_cell     shell 中用户应用的实例路径
+#   -sources      CMake 生成的文件列表脚本（定义 rtl_list / shell_list / ip_list / xci_list）
+array set opts {flow project jobs 0 incremental 0 ip_cache "" ooc 1 shell_top shell_top app_cell u_app sources ""}
+foreach {key val} [lrange $argv 5 end] {
+    set opts([string trimleft $key -]) $val
+}
+if {![string is integer -strict $opts(jobs)] || $opts(jobs) <= 0} {
+    set opts(jobs) [expr {[info exists ::env(NUMBER_OF_PROCESSORS)] ? $::env(NUMBER_OF_PROCESSORS) : 8}]
+}
 
-proc add_rtl_files {dir} {
-    foreach f [glob -nocomplain -directory $dir *] {
-        if {[file isdirectory $f]} {
-            add_rtl_files $f
-        } elseif {[string match -nocase "*.v" $f] || [string match -nocase "*.sv" $f]} {
-            add_files -norecurse $f
+# Vivado 进程内部（综合、布局布线）默认只用 2 个线程；
+# general.maxThreads 上限为 8，synth.maxThreads 上限为 4
+set max_threads [expr {min($opts(jobs), 8)}]
+set synth_threads [expr {min($opts(jobs), 4)}]
+set_param general.maxThreads $max_threads
+set_param synth.maxThreads $synth_threads
+
+# 逐层遍历：每层只做两次 glob（文件按后缀、子目录按类型过滤），不再逐项 stat
+proc rtl_files {dir {exclude ""} {patterns {*.v *.sv}}} {
+    set files {}
+    set dirs [list $dir]
+    while {[llength $dirs]} {
+        set dirs [lassign $dirs d]
+        lappend files {*}[glob -nocomplain -types f -directory $d {*}$patterns]
+        foreach sub [glob -nocomplain -types d -directory $d *] {
+            if {$sub ne $exclude} {
+                lappend dirs $sub
+            }
         }
     }
+    return $files
+}
+
+# 文件列表由 CMake 在配置阶段遍历一次后传入；单独运行本脚本时才自行遍历 rtl/
+# rtl/shell/ 只用于分离编译（其中的桩模块会与用户顶层重名）
+set shell_dir [file join $rtl_dir shell]
+if {$opts(sources) ne ""} {
+    source $opts(sources)
+} else {
+    set rtl_list [rtl_files $rtl_dir $shell_dir]
+    set shell_list [rtl_files $shell_dir]
+    set ip_list [rtl_files [file join $rtl_dir ip]]
+    set xci_list [rtl_files $rtl_dir $shell_dir *.xci]
+}
+
+# ========================
+# 分离编译（Abstract Shell）
+# ========================
+# shell：静态部分只在 rtl/shell/ 变化时综合、布线一次，
+#        用户应用以灰盒占位（rtl/shell/ 中需提供带 (* black_box *) 的桩模块，
+#        约束文件中需为该实例定义 pblock）
+# app：  只对用户 RTL 做 OOC 综合，并在 abstract shell 上布线
+set abstract_shell ${proj_dir}/abstract_shell.dcp
+
+if {$opts(flow) eq "shell"} {
+    if {![llength $shell_list]} {
+        error "rtl/shell/ 下没有源文件：请放入 shell 顶层 $opts(shell_top) 及用户应用的 (* black_box *) 桩模块，并在约束中为 $opts(app_cell) 定义 pblock"
+    }
+    read_verilog -sv $shell_list
+    if {$xdc_file != "" && [file exists $xdc_file]} {
+        read_xdc $xdc_file
+    }
+    synth_design -top $opts(shell_top) -part $part
+
+    set_property HD.RECONFIGURABLE true [get_cells $opts(app_cell)]
+    update_design -cell $opts(app_cell) -buffer_ports
+    opt_design
+    place_design
+    route_design
+
+    write_checkpoint -force ${proj_dir}/shell_routed.dcp
+    write_abstract_shell -force -cell $opts(app_cell) $abstract_shell
+    puts "✅ Abstract shell 已生成: $abstract_shell"
+    return
+}
+
+if {$opts(flow) eq "app"} {
+    if {![file exists $abstract_shell]} {
+        error "找不到 $abstract_shell，请先构建 shell 目标"
+    }
+    read_verilog -sv $rtl_list
+    synth_design -mode out_of_context -top add3_top -part $part
+    write_checkpoint -force ${proj_dir}/app_synth.dcp
+    close_design
+
+    open_checkpoint $abstract_shell
+    read_checkpoint -cell $opts(app_cell) ${proj_dir}/app_synth.dcp
+    opt_design
+    place_design
+    route_design
+
+    write_bitstream -force -cell $opts(app_cell) ${proj_dir}/${proj_name}_app.bit
+    puts "✅ 应用比特流已生成: ${proj_dir}/${proj_name}_app.bit"
+    return
+}
+
+# ========================
+# 完整工程流程
+# ========================
+# 工程保留在 build/synth 中，再次构建时直接打开，
+# 由 Vivado 自己判断源文件是否改动、哪些 run 需要重跑。
+# 打开后下面的每项设置都按本次参数重新对齐（开启与关闭都要处理），
+# 否则改了 BOARD、INCREMENTAL 等选项后仍会沿用旧工程的设置
+set xpr ${proj_dir}/${proj_name}.xpr
+if {[file exists $xpr]} {
+    open_project $xpr
+    if {[get_property PART [current_project]] ne $part} {
+        # 器件变了，旧的综合/实现结果全部作废，直接重建
+        close_project
+        create_project -force $proj_name $proj_dir -part $part
+    }
+} else {
+    create_project -force $proj_name $proj_dir -part $part
+}
+
+# 只在取值变化时设置 run 属性，避免无谓地把 run 标记为过期
+proc set_run_property {run prop value} {
+    set r [get_runs $run]
+    if {[get_property $prop $r] ne $value} {
+        set_property -name $prop -value $value -objects $r
+    }
 }
 
-add_rtl_files $rtl_dir
+# IP 缓存：配置相同的 IP 直接从缓存取综合结果，不再重新综合
+if {$opts(ip_cache) ni {"" none}} {
+    file mkdir $opts(ip_cache)
+    config_ip_cache -use_cache_location $opts(ip_cache)
+    set_property IP_CACHE_PERMISSIONS {read write} [current_project]
+}
+# IP 内部常用的 XPM 库在工程级声明，不依赖 Vivado 扫描源码时再补
+set_property XPM_LIBRARIES {XPM_CDC XPM_MEMORY} [current_project]
 
-if {$xdc_file != "" && [file exists $xdc_file]} {
+# launch_runs 的每个 run 都是独立的 Vivado 进程，不继承上面的 set_param，
+# 通过 TCL.PRE 钩子把线程数带进去。
+# 钩子脚本只在内容变化时改写：Vivado 会检查它的时间戳，无谓的改写会让 run 过期
+set threads_tcl ${proj_dir}/max_threads.tcl
+set threads_content "set_param general.maxThreads $max_threads\nset_param synth.maxThreads $synth_threads\n"
+set old_content ""
+if {[file exists $threads_tcl]} {
+    set fh [open $threads_tcl r]
+    set old_content [read $fh]
+    close $fh
+}
+if {$old_content ne $threads_content} {
+    set fh [open $threads_tcl w]
+    puts -nonewline $fh $threads_content
+    close $fh
+}
+set_run_property synth_1 STEPS.SYNTH_DESIGN.TCL.PRE $threads_tcl
+set_run_property impl_1 STEPS.INIT_DESIGN.TCL.PRE $threads_tcl
+
+# 增量编译：上次布线结果保存在项目目录之外，删除工程重建时也不会丢失
+set incr_dcp [file dirname $proj_dir]/incr/${proj_name}_routed.dcp
+if {$opts(incremental)} {
+    set_run_property synth_1 {STEPS.SYNTH_DESIGN.ARGS.MORE OPTIONS} {-incremental_mode default}
+    set_run_property impl_1 INCREMENTAL_CHECKPOINT [expr {[file exists $incr_dcp] ? $incr_dcp : ""}]
+} else {
+    set_run_property synth_1 {STEPS.SYNTH_DESIGN.ARGS.MORE OPTIONS} ""
+    set_run_property impl_1 INCREMENTAL_CHECKPOINT ""
+}
+
+# rtl/ip/ 的 OOC blockset：关闭 OOC 或对应文件已删除时先删掉，
+# 其中的文件随后由下面的同步重新加回 sources_1
+foreach fs [get_filesets -quiet -filter {FILESET_TYPE == BlockSrcs && NAME =~ "*_ooc"}] {
+    set ip_module [string range $fs 0 end-4]
+    set keep 0
+    foreach f $ip_list {
+        if {[file rootname [file tail $f]] eq $ip_module} {
+            set keep $opts(ooc)
+        }
+    }
+    if {!$keep} {
+        delete_fileset $fs
+    }
+}
+
+# 与 CMake 传入的文件列表同步：只添加新文件、移除已删除的文件，
+# 未改动的文件保留在工程中，不会让 run 过期
+set wanted [concat $rtl_list $xci_list]
+set stale {}
+foreach f [get_files -quiet -filter {FILE_TYPE == Verilog || FILE_TYPE == SystemVerilog || FILE_TYPE == IP}] {
+    if {[lsearch -exact $wanted $f] < 0} {
+        lappend stale $f
+    }
+}
+if {[llength $stale]} {
+    remove_files $stale
+}
+set added {}
+foreach f $wanted {
+    if {![llength [get_files -quiet $f]]} {
+        lappend added $f
+    }
+}
+if {[llength $added]} {
+    add_files -norecurse $added
+}
+
+# Vivado IP（.xci）：默认每个 IP 单独 OOC 综合，配置未变时直接命中 IP 缓存
+if {[llength $xci_list]} {
+    set_property GENERATE_SYNTH_CHECKPOINT [expr {$opts(ooc) ? 1 : 0}] [get_files $xci_list]
+}
+
+# 约束：只保留本次的 xdc（切换开发板后移除旧板的约束）
+set old_xdc {}
+foreach f [get_files -quiet -of_objects [get_filesets constrs_1]] {
+    if {$xdc_file eq "" || [file normalize $f] ne [file normalize $xdc_file]} {
+        lappend old_xdc $f
+    }
+}
+if {[llength $old_xdc]} {
+    remove_files -fileset constrs_1 $old_xdc
+}
+if {$xdc_file != "" && [file exists $xdc_file] && ![llength [get_files -quiet -of_objects [get_filesets constrs_1] $xdc_file]]} {
     add_files -fileset constrs_1 -norecurse $xdc_file
 }
 
 set_property top add3_top [current_fileset]
 
-launch_runs synth_1 -jobs 4
-wait_on_run synth_1
-launch_runs impl_1 -jobs 4
-wait_on_run impl_1
+# rtl/ip/ 下每个文件（文件名即模块名）单独作为 OOC 综合 run，
+# launch_runs synth_1 时与顶层一起并行调度
+update_compile_order -fileset sources_1
+if {$opts(ooc)} {
+    foreach f $ip_list {
+        set ip_module [file rootname [file tail $f]]
+        if {![llength [get_filesets -quiet ${ip_module}_ooc]]} {
+            create_fileset -blockset -define_from $ip_module ${ip_module}_ooc
+        }
+    }
+}
+
+# 只有过期（源文件或设置改动）或未完成的 run 才重跑；返回本次是否真的运行过
+proc run_if_stale {run jobs} {
+    set r [get_runs $run]
+    set ran 0
+    if {[get_property NEEDS_REFRESH $r] || [get_property PROGRESS $r] ne "100%"} {
+        reset_run $r
+        launch_runs $r -jobs $jobs
+        wait_on_run $r
+        set ran 1
+    }
+    if {[get_property PROGRESS $r] ne "100%"} {
+        error "$run 运行失败，详见 [get_property DIRECTORY $r]"
+    }
+    return $ran
+}
+run_if_stale synth_1 $opts(jobs)
+set impl_ran [run_if_stale impl_1 $opts(jobs)]
+
+# 只有 impl_1 本次重新布线后才更新增量检查点：它是 impl_1 的 INCREMENTAL_CHECKPOINT，
+# 无谓的覆盖会改变时间戳，让 impl_1 下次被判为过期
+if {$opts(incremental) && $impl_ran} {
+    file mkdir [file dirname $incr_dcp]
+    file copy -force [get_property DIRECTORY [get_runs impl_1]]/add3_top_routed.dcp $incr_dcp
+}
 
+open_run impl_1
 write_bitstream -force ${proj_dir}/${proj_name}.bit
 puts "✅ 比特流已生成: ${proj_dir}/${proj_name}.bit"